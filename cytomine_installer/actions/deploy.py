@@ -77,6 +77,9 @@ class DeployAction(AbstractAction):
       installer_config=installer_config,
     )
 
+    # listed once, used both for the backup archive and for moving deployed files
+    source_files = deployment_folder.source_files
+
     with TemporaryDirectory() as tmpdir:
       # zip current files
       if namespace.do_zip:
@@ -87,8 +90,8 @@ class DeployAction(AbstractAction):
           zip_filename = namespace.zip_filename
         zip_filepath = os.path.join(namespace.target_directory, zip_filename)
         self.get_logger().info("zipping source files into '%s'...", zip_filepath)
-        with zipfile.ZipFile(zip_filepath, "w", zipfile.ZIP_DEFLATED) as zip_archive:
-          for file in deployment_folder.source_files:
+        with zipfile.ZipFile(zip_filepath, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zip_archive:
+          for file in source_files:
             zip_archive.write(os.path.join(namespace.source_directory, file), file)
 
       self.get_logger().info("generate deployment files...")
@@ -96,18 +99,29 @@ class DeployAction(AbstractAction):
         deployment_folder=deployment_folder,
         gen_dir=tmpdir,
         target_dir=namespace.target_directory,
+        source_files=source_files,
       )
 
     self.get_logger().info("done...")
 
   def deploy_and_move(
-    self, deployment_folder: DeploymentFolder, gen_dir: str, target_dir: str
+    self,
+    deployment_folder: DeploymentFolder,
+    gen_dir: str,
+    target_dir: str,
+    source_files: list = None,
   ):
+    """Generates the deployment files in gen_dir and move them to target_dir.
+    Parameters
+    ----------
+    source_files: list
+      Source files of the deployment folder, if already listed by the caller
+    """
+    if source_files is None:
+      source_files = deployment_folder.source_files
     # generate relative paths
     deployment_folder.deploy_files(gen_dir)
-    for file_relpath in (
-      deployment_folder.generated_files + deployment_folder.source_files
-    ):
+    for file_relpath in deployment_folder.generated_files + source_files:
       self.move_file_or_folder(
         source_dir=gen_dir,
         target_dir=target_dir,
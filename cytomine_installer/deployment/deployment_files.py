@@ -1,6 +1,8 @@
 import json
 import os
+import re
 from collections import defaultdict
+from functools import cached_property
 
 import yaml
 
@@ -11,9 +13,23 @@ from .env_store import DictExportable, EnvStore, MergeEnvStorePolicy
 from .errors import (MissingConfigFileError, NoDockerComposeYamlFileError,
                      UnknownConfigSection, UnknownServiceError)
 
+# libyaml-based safe loader and dumper if available
+try:
+  from yaml import CSafeDumper as YamlDumper
+  from yaml import CSafeLoader as YamlLoader
+except ImportError:
+  from yaml import SafeDumper as YamlDumper
+  from yaml import SafeLoader as YamlLoader
+
 DOCKER_COMPOSE_FILENAME = "docker-compose.yml"
 DOCKER_COMPOSE_OVERRIDE_FILENAME = "docker-compose.override.yml"
 
+# strings that can be emitted as plain (unquoted) yaml scalars without being
+# resolved to another type (bool, null, number, ...) or breaking the structure,
+# must be used with fullmatch
+_PLAIN_YAML_STRING_PATTERN = re.compile(r"(?:[A-Za-z_]|\.?/)[A-Za-z0-9_./:@+=-]*(?<!:)")
+_YAML_BOOL_OR_NULL = {"yes", "no", "true", "false", "on", "off", "null"}
+
 
 class UnknownServerError(ValueError):
   def __init__(self, server, *args: object) -> None:
@@ -41,7 +57,7 @@ class ConfigFile(DictExportable):
       return
 
     with open(self.filepath, "r", encoding="utf8") as file:
-      raw_config = yaml.load(file, Loader=yaml.Loader)
+      raw_config = yaml.load(file, Loader=YamlLoader)
 
     if raw_config is None:
       return
@@ -82,7 +98,17 @@ class ConfigFile(DictExportable):
   def global_envs(self):
     return self._global_envs
 
-  @property
+  @cached_property
+  def flattened_global_envs(self):
+    """Global envs as a flat dictionary mapping '{NAMESPACE}_{KEY}' with the resolved values"""
+    flattened = {}
+    for namespace in self._global_envs.namespaces:
+      ns_envs = self._global_envs.get_namespace_envs(namespace)
+      ns_prefix = f"{namespace.upper()}_"
+      flattened.update({ns_prefix + key.upper(): value for key, value in ns_envs.items()})
+    return flattened
+
+  @cached_property
   def servers(self):
     return list(self._servers_env_stores.keys())
 
@@ -186,7 +212,8 @@ class DockerComposeFile:
       raise NoDockerComposeYamlFileError(self._path)
 
     with open(self.filepath, "r", encoding="utf8") as file:
-      self._content = yaml.load(file, Loader=yaml.Loader)
+      self._content = yaml.load(file, Loader=YamlLoader)
+    self._services = tuple(self._content.get("services", {}).keys())
 
   @property
   def filepath(self):
@@ -198,7 +225,7 @@ class DockerComposeFile:
 
   @property
   def services(self):
-    return list(self._content.get("services", {}).keys())
+    return self._services
 
   @property
   def version(self):
@@ -246,5 +273,44 @@ class EditableDockerCompose:
 
   def write_to(self, path, filename="docker-compose.yml"):
     filepath = os.path.join(path, filename)
-    with open(filepath, "w", encoding="utf8") as file:
-      yaml.dump(self._compose, file)
+    content = yaml.dump(self._compose, Dumper=YamlDumper)
+    with open(filepath, "wb") as file:
+      file.write(content.encode("utf8"))
+
+  @staticmethod
+  def _format_scalar(value):
+    if not isinstance(value, str):
+      # numbers, booleans, null: same representation (and type) as with write_to
+      content = yaml.dump(value, Dumper=YamlDumper)
+      if content.endswith("\n...\n"):
+        content = content[:-len("...\n")]
+      return content.rstrip("\n")
+    if _PLAIN_YAML_STRING_PATTERN.fullmatch(value) and value.lower() not in _YAML_BOOL_OR_NULL:
+      return value
+    # a json string is a valid yaml double-quoted scalar
+    return json.dumps(value)
+
+  def write_to_fast(self, path, filename="docker-compose.yml"):
+    """Same output content as write_to but formatted directly (without the yaml
+    emitter) as the structure of the file is known in advance"""
+    fmt = self._format_scalar
+    lines = []
+    services = self._compose["services"]
+    if len(services) == 0:
+      lines.append("services: {}")
+    else:
+      lines.append("services:")
+    for service in sorted(services):
+      service_dict = services[service]
+      lines.append(f"  {fmt(service)}:{'' if service_dict else ' {}'}")
+      if "env_file" in service_dict:
+        lines.append(f"    env_file: {fmt(service_dict['env_file'])}")
+      if "volumes" in service_dict:
+        lines.append(f"    volumes:{'' if service_dict['volumes'] else ' []'}")
+        lines.extend(f"    - {fmt(volume)}" for volume in service_dict["volumes"])
+    if "version" in self._compose:
+      lines.append(f"version: {fmt(self._compose['version'])}")
+    lines.append("")
+    filepath = os.path.join(path, filename)
+    with open(filepath, "wb") as file:
+      file.write("\n".join(lines).encode("utf8"))
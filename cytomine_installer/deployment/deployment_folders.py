@@ -1,6 +1,7 @@
 import os
 import shutil
 from abc import ABC, abstractmethod
+from functools import cached_property
 
 import yaml
 
@@ -10,10 +11,27 @@ from cytomine_installer.deployment.installer_config import InstallerConfig
 from ..util import list_relative_files, write_dotenv
 from .deployment_files import (DOCKER_COMPOSE_FILENAME,
                                DOCKER_COMPOSE_OVERRIDE_FILENAME, ConfigFile,
-                               DockerComposeFile, EditableDockerCompose)
+                               DockerComposeFile, EditableDockerCompose,
+                               YamlDumper)
 from .errors import InvalidServerConfigurationError
 
 
+def _fast_copytree(src, dst):
+  """Recursively copy the content of src into dst (created if missing). Like
+  shutil.copytree with symlinks=False, symlinks are followed and the content they
+  point to is copied. Files are copied with shutil.copyfile (zero-copy when supported
+  by the platform) and keep their permission bits."""
+  with os.scandir(src) as entries:
+    os.makedirs(dst, exist_ok=True)
+    for entry in entries:
+      dst_path = os.path.join(dst, entry.name)
+      if entry.is_dir():
+        _fast_copytree(entry.path, dst_path)
+      else:
+        shutil.copyfile(entry.path, dst_path)
+        shutil.copymode(entry.path, dst_path)
+
+
 class Deployable(ABC):
   @abstractmethod
   def deploy_files(self, target_directory):
@@ -107,21 +125,29 @@ class ServerFolder(Deployable):
       files.append(os.path.join(self._configs_folder, config_file))
     return files
 
-  @property
+  @cached_property
   def generated_files(self):
+    # only depends on the docker-compose services and the envs, computed once
+    # (immutable as it is shared between calls, in docker-compose services order)
     target_files = []
     target_files.append(".env")
     target_files.append(DOCKER_COMPOSE_OVERRIDE_FILENAME)
     if not self._envs.has_server(self._server_name):
-      return target_files
+      return tuple(target_files)
+    env_namespaces = frozenset(self._envs.server_store(self._server_name).namespaces)
     for service in self._docker_compose_file.services:
-      env_store = self._envs.server_store(self._server_name)
-      if env_store.has_namespace(service):
+      if service in env_namespaces:
         target_files.append(os.path.join(self._envs_folder, f"{service}.env"))
-    return target_files
+    return tuple(target_files)
 
   def deploy_files(self, target_directory):
     """Generates a target server folder"""
+    services = self._docker_compose_file.services
+    env_store, env_namespaces = None, frozenset()
+    if self._envs.has_server(self._server_name):
+      env_store = self._envs.server_store(self._server_name)
+      env_namespaces = frozenset(env_store.namespaces)
+
     # docker-compose
     shutil.copyfile(
       self._docker_compose_file.filepath,
@@ -129,64 +155,55 @@ class ServerFolder(Deployable):
     )
 
     # .env file
-    global_envs = {}
-    for namespace in self._envs.global_envs.namespaces:
-      ns_envs = self._envs.global_envs.get_namespace_envs(namespace)
-      global_envs.update({
-        f"{namespace.upper()}_{key.upper()}": value
-        for key, value in ns_envs.items()
-      })
-    write_dotenv(target_directory, global_envs)
+    write_dotenv(target_directory, self._envs.flattened_global_envs)
 
     # docker-compose.override.yml
     override_file = EditableDockerCompose(version=None)  # version key is deprecated
 
-    # envs/{SERVICE}.env files
-    if self._envs.has_server(self._server_name):
-      target_envs = os.path.join(target_directory, self._envs_folder)
-      os.makedirs(target_envs)
-      for service in self._docker_compose_file.services:
-        env_store = self._envs.server_store(self._server_name)
-        if not env_store.has_namespace(service):
-          continue
+    # envs/{SERVICE}.env files and configs volumes
+    target_envs = os.path.join(target_directory, self._envs_folder)
+    envs_folder_created = False
+    mount_point = self._configs_mount_point.rstrip("/")
+    for service in services:
+      if service in env_namespaces:
+        if not envs_folder_created:
+          os.makedirs(target_envs, exist_ok=True)
+          envs_folder_created = True
         service_envs = env_store.get_namespace_envs(service)
         env_filepath = write_dotenv(target_envs, service_envs, filename=f"{service}.env")
         override_file.set_service_env_file(service, os.path.relpath(env_filepath, target_directory))
 
-    # configs
-    for service in self._docker_compose_file.services:
       src_service_configs_path = os.path.join(self._directory, self._configs_folder, service)
       if os.path.exists(src_service_configs_path):
         config_files = list_relative_files(src_service_configs_path)
         for config_file in sorted(config_files):
-          source_file = os.path.join(self._configs_folder, service, config_file)
-          target_file = os.path.join(self._configs_mount_point, config_file)
+          # compose volume paths always use forward slashes, whatever the platform separator
+          config_file = config_file.replace(os.sep, "/")
+          source_file = f"{self._configs_folder}/{service}/{config_file}"
+          target_file = f"{mount_point}/{config_file}"
           override_file.add_service_volume(service, f"./{source_file}:{target_file}")
 
-    src_config_dir = os.path.join(self._directory, self._configs_folder)
-    if os.path.exists(src_config_dir):
-      shutil.copytree(src_config_dir, os.path.join(target_directory, self._configs_folder),)
+    if self.has_config:
+      _fast_copytree(self.configs_path, os.path.join(target_directory, self._configs_folder))
 
     # save override
-    override_file.write_to(target_directory, DOCKER_COMPOSE_OVERRIDE_FILENAME)
+    override_file.write_to_fast(target_directory, DOCKER_COMPOSE_OVERRIDE_FILENAME)
 
     return target_directory
 
   def clean_generated_files(self, target_directory):
     for file_to_remove in self.generated_files:
       file_path = os.path.join(target_directory, file_to_remove)
-      if not os.path.exists(file_path):
-        continue
-      os.remove(file_path)
       try:
-        os.removedirs(os.path.dirname(file_path))
-      except OSError:
-        pass
+        os.remove(file_path)
+      except FileNotFoundError:
+        continue
 
-    # double-check 'envs' folder
-    envs_folder = os.path.join(self._directory, self._envs_folder)
-    if os.path.isdir(envs_folder):
-      os.rmdir(envs_folder)
+    # remove the 'envs' folder only if nothing else than generated files was in it
+    try:
+      os.rmdir(os.path.join(target_directory, self._envs_folder))
+    except OSError:
+      pass  # missing or not empty
 
 
 class DeploymentFolder(Deployable):
@@ -269,7 +286,10 @@ class DeploymentFolder(Deployable):
     )
 
     self._server_folders = {}
-    _, subdirs, subfiles = next(os.walk(self._directory))
+    subdirs, subfiles = [], []
+    with os.scandir(self._directory) as entries:
+      for entry in entries:
+        (subdirs if entry.is_dir() else subfiles).append(entry.name)
     self._subdirs = set(subdirs).difference(self._ignore_dirs)
 
     ## checking server configuration (single or multi-server?)
@@ -330,8 +350,9 @@ class DeploymentFolder(Deployable):
   def deploy_files(self, target_directory):
     # write config (cytomine.yml)
     dst_config_path = os.path.join(target_directory, self._merge_config.filename)
-    with open(dst_config_path, "w", encoding="utf8") as file:
-      yaml.dump(self._merge_config.export_dict(), file)
+    content = yaml.dump(self._merge_config.export_dict(), Dumper=YamlDumper)
+    with open(dst_config_path, "wb") as file:
+      file.write(content.encode("utf8"))
 
     # write template and config (if any in the base repository), copy file to avoid any change
     files_to_copy = [
@@ -362,7 +383,11 @@ class DeploymentFolder(Deployable):
       server_folder.clean_generated_files(target_directory)
 
   def _abs_to_relative(self, src_dir, files, ref_dir):
-    return [os.path.relpath(os.path.join(src_dir, file), ref_dir) for file in files]
+    # files are relative to src_dir, only the prefix has to be computed
+    rel_src_dir = os.path.relpath(src_dir, ref_dir)
+    if rel_src_dir == os.curdir:
+      return list(files)
+    return [os.path.join(rel_src_dir, file) for file in files]
 
   @property
   def source_files(self):
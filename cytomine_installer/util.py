@@ -8,27 +8,30 @@ def write_dotenv(directory: str, envs: dict, filename: str = ".env"):
   """
   filepath = os.path.join(directory, filename)
   newline_pattern = re.compile(r"(?:\r\n|\n|\r)")
-  with open(filepath, "w", encoding="utf8") as file:
-    for key, value in sorted(envs.items()):
-      if isinstance(value, bool):
-        value = "true" if value else "false"
-      if newline_pattern.search(str(value)) is not None:
-        value = f'"{value}"'
-      file.write(f"{key}={value}{os.linesep}")
+  lines = []
+  for key, value in sorted(envs.items()):
+    if isinstance(value, bool):
+      value = "true" if value else "false"
+    if newline_pattern.search(str(value)) is not None:
+      value = f'"{value}"'
+    lines.append(f"{key}={value}{os.linesep}")
+  # single write of the whole content
+  with open(filepath, "wb") as file:
+    file.write("".join(lines).encode("utf8"))
   return filepath
 
 
 def list_relative_files(_dir: str):
+  """List files in _dir (recursively), paths are relative to _dir"""
   if not os.path.isdir(_dir):
     return []
-  curr, dirs, files = next(os.walk(_dir))
-  for dirname in dirs:
-    files.extend(
-      [
-        os.path.join(dirname, filepath)
-        for filepath in list_relative_files(os.path.join(curr, dirname))
-      ]
-    )
+  files = []
+  # symlinked directories are listed like regular ones
+  for curr, _, filenames in os.walk(_dir, followlinks=True):
+    # relative prefix computed once per directory
+    rel_curr = os.path.relpath(curr, _dir)
+    prefix = "" if rel_curr == os.curdir else rel_curr + os.sep
+    files.extend(prefix + filename for filename in filenames)
   return files
 
 
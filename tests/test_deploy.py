@@ -5,16 +5,17 @@
 import contextlib
 import io
 import os
+import shutil
 import unittest
 import zipfile
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
 import yaml
-from setuptools._distutils.dir_util import copy_tree
 
 from cytomine_installer import parser
 from cytomine_installer.actions.errors import InvalidTargetDirectoryError
+from cytomine_installer.deployment.deployment_files import YamlLoader
 from cytomine_installer.deployment.deployment_folders import \
     InvalidServerConfigurationError
 from cytomine_installer.util import list_relative_files
@@ -99,6 +100,33 @@ class TestDeploy(TestDeploymentGeneric):
           sorted(list_relative_files(deploy_file_path)),
         )
 
+  def test_deploy_single_server_with_symlinked_config(self):
+    tests_path = os.path.dirname(__file__)
+    deploy_file_path = os.path.join(
+      tests_path, "files", "fake_single_server_no_auto", "in"
+    )
+    with TemporaryDirectory() as srcdir, TemporaryDirectory() as tmpdir:
+      shutil.copytree(deploy_file_path, srcdir, dirs_exist_ok=True)
+      os.makedirs(os.path.join(srcdir, "shared"))
+      with open(os.path.join(srcdir, "shared", "common.conf"), "w", encoding="utf8") as file:
+        file.write("common=1\n")
+      # relative link, dangling if the link itself is copied to another folder
+      try:
+        os.symlink(
+          os.path.join("..", "..", "shared", "common.conf"),
+          os.path.join(srcdir, "configs", "core", "common.conf"),
+        )
+      except (OSError, NotImplementedError):
+        self.skipTest("symlinks are not supported")
+
+      parser.call(["deploy", "-s", srcdir, "-t", tmpdir])
+
+      deployed_filepath = os.path.join(tmpdir, "configs", "core", "common.conf")
+      self.assertFalse(os.path.islink(deployed_filepath))
+      self.assert_is_file(deployed_filepath)
+      with open(deployed_filepath, "r", encoding="utf8") as file:
+        self.assertEqual(file.read(), "common=1\n")
+
   def test_deploy_single_server_template_only(self):
     tests_path = os.path.dirname(__file__)
     deploy_file_path = os.path.join(tests_path, "files", "fake_single_server_template_only", "in")
@@ -161,7 +189,7 @@ class TestDeploy(TestDeploymentGeneric):
         self.assertRegex(var_value, UUID_PATTERN)
 
       with open(os.path.join(tmpdir, "cytomine.yml"), "r", encoding="utf8") as file:
-        yml_content = yaml.load(file, Loader=yaml.Loader)
+        yml_content = yaml.load(file, Loader=YamlLoader)
         self.assertRegex(yml_content["global"]["ns1"]["constant"]["VAR1"], UUID_PATTERN)
         self.assertEqual(yml_content["global"]["ns1"]["constant"]["VAR1"], var_value)
 
@@ -171,7 +199,7 @@ class TestDeploy(TestDeploymentGeneric):
       )
 
       with open(os.path.join(tmpdir, "cytomine.template"), "r", encoding="utf8") as file:
-        yml_content = yaml.load(file, Loader=yaml.Loader)
+        yml_content = yaml.load(file, Loader=YamlLoader)
         self.assertRegex(yml_content["global"]["ns1"]["auto"]["VAR1"], "random_uuid")
 
   def test_deploy_single_server_multiline_env(self):
@@ -268,7 +296,7 @@ class TestDeploy(TestDeploymentGeneric):
 
     stream = io.StringIO()
     with TemporaryDirectory() as tmpdir, contextlib.redirect_stderr(stream):
-      copy_tree(src=deploy_ref_in, dst=tmpdir)
+      shutil.copytree(deploy_ref_in, tmpdir, dirs_exist_ok=True, copy_function=shutil.copyfile)
       parser.call(["deploy", "-s", tmpdir], raise_boostrapper_errors=True)
 
       self.check_single_server_deployment(deploy_ref_out, tmpdir)
@@ -281,7 +309,7 @@ class TestDeploy(TestDeploymentGeneric):
 
     stream = io.StringIO()
     with TemporaryDirectory() as tmpdir, contextlib.redirect_stderr(stream):
-      copy_tree(src=deploy_ref_in, dst=tmpdir)
+      shutil.copytree(deploy_ref_in, tmpdir, dirs_exist_ok=True, copy_function=shutil.copyfile)
       parser.call(["deploy", "-s", tmpdir, "-z"], raise_boostrapper_errors=True)
 
       self.check_single_server_deployment(deploy_ref_out, tmpdir)
@@ -301,7 +329,7 @@ class TestDeploy(TestDeploymentGeneric):
 
     stream = io.StringIO()
     with TemporaryDirectory() as tmpdir, contextlib.redirect_stderr(stream):
-      copy_tree(src=deploy_ref_in, dst=tmpdir)
+      shutil.copytree(deploy_ref_in, tmpdir, dirs_exist_ok=True, copy_function=shutil.copyfile)
       parser.call(
         [
           "deploy",
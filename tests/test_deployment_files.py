@@ -5,7 +5,8 @@ from unittest import TestCase
 import yaml
 
 from cytomine_installer.deployment.deployment_files import (
-    ConfigFile, DockerComposeFile, EditableDockerCompose, UnknownConfigSection)
+    ConfigFile, DockerComposeFile, EditableDockerCompose, UnknownConfigSection,
+    YamlLoader)
 from cytomine_installer.deployment.env_store import UnknownValueTypeError
 from tests.util import UUID_PATTERN
 
@@ -71,6 +72,22 @@ class TestConfigFile(TestCase):
       config_file.global_envs.get_env("namespace2", "KEY1"),
     )
 
+  def test_flattened_global_envs(self):
+    tests_path = os.path.dirname(__file__)
+    ce_path = os.path.join(tests_path, "files")
+    config_file = ConfigFile(ce_path, filename="cytomine.mini.yml")
+    flattened = config_file.flattened_global_envs
+    self.assertSetEqual(
+      set(flattened.keys()),
+      {"NAMESPACE1_VAR1", "NAMESPACE1_VAR2", "NAMESPACE2_KEY1", "NAMESPACE2_KEY2"},
+    )
+    self.assertEqual(flattened["NAMESPACE1_VAR1"], "value1")
+    self.assertEqual(flattened["NAMESPACE1_VAR2"], "value2")
+    self.assertEqual(
+      flattened["NAMESPACE2_KEY1"],
+      config_file.global_envs.get_env("namespace2", "KEY1"),
+    )
+
   def test_file_with_invalid_value_type(self):
     tests_path = os.path.dirname(__file__)
     ce_path = os.path.join(tests_path, "files")
@@ -110,7 +127,7 @@ class TestEditableDockerCompose(TestCase):
       with open(
         os.path.join(tmpdir, "docker-compose.yml"), "r", encoding="utf8"
       ) as file:
-        edc_content = yaml.load(file, Loader=yaml.Loader)
+        edc_content = yaml.load(file, Loader=YamlLoader)
 
     self.assertDictEqual({"version": dc_version, "services": {}}, edc_content)
 
@@ -126,7 +143,7 @@ class TestEditableDockerCompose(TestCase):
       with open(
         os.path.join(tmpdir, "docker-compose.yml"), "r", encoding="utf8"
       ) as file:
-        edc_content = yaml.load(file, Loader=yaml.Loader)
+        edc_content = yaml.load(file, Loader=YamlLoader)
 
     self.assertDictEqual(
       {"version": dc_version, "services": {service: {"env_file": env_file_path}}},
@@ -146,9 +163,37 @@ class TestEditableDockerCompose(TestCase):
       with open(
         os.path.join(tmpdir, "docker-compose.yml"), "r", encoding="utf8"
       ) as file:
-        edc_content = yaml.load(file, Loader=yaml.Loader)
+        edc_content = yaml.load(file, Loader=YamlLoader)
 
     self.assertDictEqual(
       {"version": dc_version, "services": {service: {"volumes": volumes}}},
       edc_content,
     )
+
+  def _assert_fast_matches_slow(self, edc):
+    with TemporaryDirectory() as tmpdir:
+      edc.write_to(tmpdir, "slow.yml")
+      edc.write_to_fast(tmpdir, "fast.yml")
+      with open(os.path.join(tmpdir, "slow.yml"), "r", encoding="utf8") as file:
+        slow_content = yaml.load(file, Loader=YamlLoader)
+      with open(os.path.join(tmpdir, "fast.yml"), "r", encoding="utf8") as file:
+        fast_content = yaml.load(file, Loader=YamlLoader)
+
+    self.assertDictEqual(slow_content, fast_content)
+    return fast_content
+
+  def test_write_to_fast_same_content_as_write_to(self):
+    edc = EditableDockerCompose("3.8")
+    edc.set_service_env_file("core", "envs/core.env")
+    edc.add_service_volume("core", "./configs/core/app.yml:/cm_configs/app.yml")
+    edc.add_service_volume("core", "./configs/core/my file #1.yml:/cm_configs/my file #1.yml")
+    edc.set_service_env_file("yes", "null")
+    self._assert_fast_matches_slow(edc)
+
+  def test_write_to_fast_same_content_as_write_to_special_values(self):
+    edc = EditableDockerCompose(3.8)
+    edc.set_service_env_file("core", "envs/core.env\n")
+    edc.set_service_env_file("ab\n", "envs/ab.env")
+    edc.add_service_volume("ab\n", "a:b\n")
+    fast_content = self._assert_fast_matches_slow(edc)
+    self.assertIsInstance(fast_content["version"], float)
@@ -1,128 +1,159 @@
 import os
 import shutil
 import unittest
-from tempfile import TemporaryDirectory
+from tempfile import TemporaryDirectory, mkdtemp
 
 from cytomine_installer.deployment.deployment_files import ConfigFile
 from cytomine_installer.deployment.deployment_folders import (
     DeploymentFolder, InvalidServerConfigurationError, ServerFolder)
-from cytomine_installer.util import list_relative_files
-from tests.util import FileSystemTestCase, TestDeploymentGeneric
+from tests.util import FileSystemTestCase, TestDeploymentGeneric, scan_relative_files
 
+_TESTS_DIR = os.path.dirname(__file__)
+_FILES_DIR = os.path.join(_TESTS_DIR, "files")
+_SINGLE_IN = os.path.join(_FILES_DIR, "fake_single_server", "in")
+_SINGLE_OUT = os.path.join(_FILES_DIR, "fake_single_server", "out")
+_MULTI_IN = os.path.join(_FILES_DIR, "fake_multi_server", "in")
+_MULTI_OUT = os.path.join(_FILES_DIR, "fake_multi_server", "out")
+_NO_CYT = os.path.join(_FILES_DIR, "fake_no_cytomine_yml")
+_NO_DC = os.path.join(_FILES_DIR, "fake_no_docker_compose_yml")
+_MULTI_MISSING = os.path.join(_FILES_DIR, "fake_multi_server_missing_folder")
 
-class TestServerFolder(FileSystemTestCase):
-  def test_list_source_files(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(tests_path, "files", "fake_single_server", "in")
-    envs_file = ConfigFile(deploy_path)
-    server_folder = ServerFolder("default", deploy_path, envs_file)
-    self.assertSetEqual(
-      set(server_folder.source_files),
-      {
-        "configs/core/etc/cytomine/cytomine-app.yml",
-        "configs/ims/usr/local/cytom/ims.conf",
-        "docker-compose.yml",
-      },
-    )
 
-  def test_generated_files(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(tests_path, "files", "fake_single_server", "in")
-    envs_file = ConfigFile(deploy_path)
-    server_folder = ServerFolder("default", deploy_path, envs_file)
-    self.assertSetEqual(
-      set(server_folder.generated_files),
-      {"envs/core.env", "envs/ims.env", ".env", "docker-compose.override.yml"},
+class TestServerFolder(FileSystemTestCase):
+  @classmethod
+  def setUpClass(cls):
+    # input fixtures are read-only, parse them once for all tests
+    cls.single_envs = ConfigFile(_SINGLE_IN)
+    cls.multi_envs = ConfigFile(_MULTI_IN)
+    cls.single_server_folder = ServerFolder("default", _SINGLE_IN, cls.single_envs)
+    cls.multi_core_server_folder = ServerFolder(
+      "server-core", os.path.join(_MULTI_IN, "server-core"), cls.multi_envs
     )
+    # file listings, computed once
+    cls.single_source_files = frozenset(cls.single_server_folder.source_files)
+    cls.single_generated_files = frozenset(cls.single_server_folder.generated_files)
+    cls.multi_core_source_files = frozenset(cls.multi_core_server_folder.source_files)
+    cls.multi_core_generated_files = frozenset(cls.multi_core_server_folder.generated_files)
 
-  def test_target_files(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(tests_path, "files", "fake_single_server", "in")
-    envs_file = ConfigFile(deploy_path)
-    server_folder = ServerFolder("default", deploy_path, envs_file)
-    self.assertSetEqual(
-      set(server_folder.target_files),
-      set(server_folder.source_files).union(server_folder.generated_files),
-    )
+  def test_server_folder_file_sets(self):
+    single_sources = {
+      "configs/core/etc/cytomine/cytomine-app.yml",
+      "configs/ims/usr/local/cytom/ims.conf",
+      "docker-compose.yml",
+    }
+    single_generated = {"envs/core.env", "envs/ims.env", ".env", "docker-compose.override.yml"}
+    # one service (postgres) without envs in the multi-server core folder
+    multi_core_sources = {"configs/core/etc/cytomine/cytomine-app.yml", "docker-compose.yml"}
+    multi_core_generated = {
+      "envs/core.env",
+      "envs/postgres.env",
+      ".env",
+      "docker-compose.override.yml",
+    }
+    cases = [
+      ("single source", self.single_source_files, single_sources),
+      ("single generated", self.single_generated_files, single_generated),
+      ("single target", self.single_server_folder.target_files, single_sources | single_generated),
+      ("multi core source", self.multi_core_source_files, multi_core_sources),
+      ("multi core generated", self.multi_core_generated_files, multi_core_generated),
+    ]
+    for name, actual, expected in cases:
+      with self.subTest(name):
+        self.assertSetEqual(set(actual), expected)
 
-  def test_files_functions_one_service_without_envs(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(tests_path, "files", "fake_multi_server", "in")
-    server_path = os.path.join(deploy_path, "server-core")
-    envs_file = ConfigFile(deploy_path)
-    server_folder = ServerFolder("server-core", server_path, envs_file)
-    self.assertSetEqual(
-      set(server_folder.source_files),
-      {"configs/core/etc/cytomine/cytomine-app.yml", "docker-compose.yml"},
-    )
-    self.assertSetEqual(
-      set(server_folder.generated_files),
-      {
-        "envs/core.env",
-        "envs/postgres.env",
+  def test_generated_files_order(self):
+    # env files in docker-compose services order, independent of the hash seed
+    self.assertTupleEqual(
+      self.single_server_folder.generated_files,
+      (
         ".env",
         "docker-compose.override.yml",
-      },
+        os.path.join("envs", "core.env"),
+        os.path.join("envs", "ims.env"),
+      ),
     )
 
   def test_clean_valid(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(tests_path, "files", "fake_multi_server", "in")
-    server_path = os.path.join(deploy_path, "server-core")
-    out_deploy_path = os.path.join(tests_path, "files", "fake_multi_server", "out")
-    out_server_path = os.path.join(out_deploy_path, "server-core")
-    envs_file = ConfigFile(deploy_path)
-    server_folder = ServerFolder("server-core", server_path, envs_file)
+    out_server_path = os.path.join(_MULTI_OUT, "server-core")
+    server_folder = self.multi_core_server_folder
     with TemporaryDirectory() as tmpdir:
       target_server_path = os.path.join(tmpdir, "out")
-      shutil.copytree(out_server_path, target_server_path)
+      try:
+        # clean only unlinks files, so hard links are enough
+        shutil.copytree(out_server_path, target_server_path, copy_function=os.link)
+      except OSError:
+        # no hard link support (e.g. fixtures and tmpdir on different file systems)
+        shutil.rmtree(target_server_path, ignore_errors=True)
+        shutil.copytree(out_server_path, target_server_path)
       self.assertSetEqual(
-        set(list_relative_files(target_server_path)),
-        set(server_folder.target_files),
+        set(scan_relative_files(target_server_path)),
+        self.multi_core_source_files.union(self.multi_core_generated_files),
       )
       server_folder.clean_generated_files(target_server_path)
       self.assertSetEqual(
-        set(list_relative_files(target_server_path)),
-        set(server_folder.source_files),
+        set(scan_relative_files(target_server_path)),
+        self.multi_core_source_files,
       )
 
 
-class TestDeploymentFolder(TestDeploymentGeneric):
-  def test_single_server_deployment(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(tests_path, "files", "fake_single_server", "in")
-    output_ref_path = os.path.join(tests_path, "files", "fake_single_server", "out")
-    deployment_folder = DeploymentFolder(directory=deploy_path)
+  def test_clean_keeps_unrelated_env_files(self):
+    out_server_path = os.path.join(_MULTI_OUT, "server-core")
     with TemporaryDirectory() as tmpdir:
-      deployment_folder.deploy_files(tmpdir)
-      self.check_single_server_deployment(output_ref_path, tmpdir)
+      target_server_path = os.path.join(tmpdir, "out")
+      shutil.copytree(out_server_path, target_server_path)
+      with open(os.path.join(target_server_path, "envs", "custom.env"), "w", encoding="utf8") as file:
+        file.write("CUSTOM=1\n")
+      self.multi_core_server_folder.clean_generated_files(target_server_path)
+      self.assertSetEqual(
+        set(scan_relative_files(target_server_path)),
+        self.multi_core_source_files.union({os.path.join("envs", "custom.env")}),
+      )
+
+
+class TestDeploymentFolder(TestDeploymentGeneric):
+  @classmethod
+  def setUpClass(cls):
+    cls.single_deployment_folder = DeploymentFolder(directory=_SINGLE_IN)
+    cls.single_out_files = tuple(scan_relative_files(_SINGLE_OUT))
+    # deploy once, the generated files are checked by several tests
+    cls.single_gen_path = mkdtemp()
+    # registered before deploying, also runs if setUpClass fails
+    cls.addClassCleanup(shutil.rmtree, cls.single_gen_path, True)
+    cls.single_deployment_folder.deploy_files(cls.single_gen_path)
+
+  def _check_single_server_deployment_files(self, filter_fn):
+    out_rel_files = [f for f in self.single_out_files if filter_fn(os.path.basename(f))]
+    self.assertGreater(len(out_rel_files), 0)
+    self.check_single_server_deployment(
+      _SINGLE_OUT, self.single_gen_path, out_rel_files=out_rel_files
+    )
+
+  def test_single_server_deployment_cytomine_yml(self):
+    self._check_single_server_deployment_files(lambda filename: filename == "cytomine.yml")
+
+  def test_single_server_deployment_dotenv_files(self):
+    self._check_single_server_deployment_files(lambda filename: filename.endswith(".env"))
+
+  def test_single_server_deployment_other_files(self):
+    self._check_single_server_deployment_files(
+      lambda filename: filename != "cytomine.yml" and not filename.endswith(".env")
+    )
 
   @unittest.skip("implement later")
   def test_multi_server_configuration(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(tests_path, "files", "fake_multi_server", "in")
-    output_ref_path = os.path.join(tests_path, "files", "fake_multi_server", "out")
-    deployment_folder = DeploymentFolder(directory=deploy_path)
+    deployment_folder = DeploymentFolder(directory=_MULTI_IN)
     with TemporaryDirectory() as tmpdir:
       deployment_folder.deploy_files(tmpdir)
-      self.assert_same_directories(output_ref_path, tmpdir)
+      self.assert_same_directories(tmpdir, _MULTI_OUT)
 
   def test_multi_server_missing_server_folder(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(
-      tests_path, "files", "fake_multi_server_missing_folder"
-    )
     with self.assertRaises(InvalidServerConfigurationError):
-      DeploymentFolder(directory=deploy_path)
+      DeploymentFolder(directory=_MULTI_MISSING)
 
   def test_no_cytomine_yml(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(tests_path, "files", "fake_no_cytomine_yml")
     with self.assertRaises(FileNotFoundError):
-      DeploymentFolder(directory=deploy_path)
+      DeploymentFolder(directory=_NO_CYT)
 
   def test_no_docker_compose_file(self):
-    tests_path = os.path.dirname(__file__)
-    deploy_path = os.path.join(tests_path, "files", "fake_no_docker_compose_yml")
     with self.assertRaises(InvalidServerConfigurationError):
-      DeploymentFolder(directory=deploy_path)
+      DeploymentFolder(directory=_NO_DC)
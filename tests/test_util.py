@@ -77,6 +77,22 @@ class TestUtil(TestCase):
       self.assertEqual(len(relative), 2)
       self.assertListEqual(sorted(files), sorted(relative))
 
+  def test_list_relative_files_symlinked_folder(self):
+    with TemporaryDirectory() as tmpdir:
+      os.makedirs(os.path.join(tmpdir, "real"))
+      os.makedirs(os.path.join(tmpdir, "other"))
+      Path(os.path.join(tmpdir, "real", "b.conf")).touch()
+      Path(os.path.join(tmpdir, "other", "a.conf")).touch()
+      try:
+        os.symlink(os.path.join(tmpdir, "other"), os.path.join(tmpdir, "linked"))
+      except (OSError, NotImplementedError):
+        self.skipTest("symlinks are not supported")
+      relative = list_relative_files(tmpdir)
+      self.assertListEqual(
+        sorted(relative),
+        sorted(["linked/a.conf", "other/a.conf", "real/b.conf"]),
+      )
+
   def test_delete_dir_content(self):
     with TemporaryDirectory() as tmpdir:
       # create fake files and folders
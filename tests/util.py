@@ -1,40 +1,125 @@
 # regex pattern for a UUID
+import functools
+import mmap
+import operator
 import os
-import pathlib
+import re
 from unittest import TestCase
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import yaml
 
+from cytomine_installer.deployment.deployment_files import YamlLoader
 from cytomine_installer.util import list_relative_files
 
 
 UUID_PATTERN = r"[a-z0-9]{8}-[a-z0-9]{4}-[a-z0-9]{4}-[a-z0-9]{4}-[a-z0-9]{12}"
 
+# a 'KEY=value' entry of a dotenv file, a double-quoted value can span several lines
+DOTENV_LINE_PATTERN = re.compile(r'^([^=\n]+)=("[^"]*"|.*)$', re.MULTILINE)
+
 
 def parse_yaml(path, filename):
-  with open(os.path.join(path, filename), "r", encoding="utf8") as file:
-    return yaml.load(file, Loader=yaml.Loader)
+  # libyaml reads the raw bytes directly, no need for a text stream
+  with open(os.path.join(path, filename), "rb") as file:
+    return yaml.load(file, Loader=YamlLoader)
 
 
 def parse_dotenv(path):
+  """Parses 'KEY=value' entries, a double-quoted value can span several lines.
+  Raises ValueError on content that is not part of an entry.
+  """
   with open(path, "r", encoding="utf8") as file:
-    return {
-      line.split("=", 1)[0]: line.strip().split("=", 1)[1]
-      for line in file.readlines()
-    }
+    content = file.read()
+  envs = {}
+  position = 0
+  for match in DOTENV_LINE_PATTERN.finditer(content):
+    _check_dotenv_blank(path, content[position:match.start()])
+    key, value = match.groups()
+    envs[key.strip()] = value.strip()
+    position = match.end()
+  _check_dotenv_blank(path, content[position:])
+  return envs
+
+
+def _check_dotenv_blank(path, skipped):
+  if len(skipped.strip()) > 0:
+    raise ValueError(f"invalid content in dotenv file '{path}': {skipped.strip()!r}")
+
+
+def same_file_bytes(path1, path2):
+  """Compares the raw content of two files through memory maps (no copy in the Python heap)"""
+  size = os.path.getsize(path1)
+  if size != os.path.getsize(path2):
+    return False
+  if size == 0:
+    return True  # empty files cannot be mapped
+  with open(path1, "rb") as file1, open(path2, "rb") as file2:
+    with mmap.mmap(file1.fileno(), 0, access=mmap.ACCESS_READ) as map1, mmap.mmap(
+      file2.fileno(), 0, access=mmap.ACCESS_READ
+    ) as map2:
+      # views must be released before the maps are closed
+      with memoryview(map1) as view1, memoryview(map2) as view2:
+        return view1 == view2
+
+
+def scan_relative_files(root):
+  """Yields the files under root (recursively), paths are relative to root.
+  Same listing as list_relative_files but uses the entry types cached by os.scandir
+  instead of stat-ing each entry.
+  """
+  stack = [("", root)]
+  while stack:
+    rel_dir, dir_path = stack.pop()
+    with os.scandir(dir_path) as entries:
+      for entry in entries:
+        rel_path = f"{rel_dir}{os.sep}{entry.name}" if rel_dir else entry.name
+        if entry.is_dir():  # follows symlinks, as list_relative_files
+          stack.append((rel_path, entry.path))
+        else:
+          yield rel_path
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_parse_yaml(path, mtime_ns, size):
+  # pylint: disable=unused-argument
+  # (mtime_ns, size) are part of the cache key so that a file re-generated at the same path is parsed again
+  with open(path, "rb") as file:
+    return yaml.load(file, Loader=YamlLoader)
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_parse_dotenv(path, mtime_ns, size):
+  # pylint: disable=unused-argument
+  return parse_dotenv(path)
+
+
+def _parsed_yaml(path):
+  """Parsed yaml content (cached, must not be modified)"""
+  file_stat = os.stat(path)
+  return _cached_parse_yaml(path, file_stat.st_mtime_ns, file_stat.st_size)
+
+
+def _parsed_dotenv(path):
+  """Parsed dotenv content (cached, must not be modified)"""
+  file_stat = os.stat(path)
+  return _cached_parse_dotenv(path, file_stat.st_mtime_ns, file_stat.st_size)
 
 
 class FileSystemTestCase(TestCase):
   maxDiff = None
 
   def assert_is_file(self, path):
-    if not pathlib.Path(path).resolve().is_file():
+    if not os.path.isfile(path):
       raise AssertionError(f"file does not exist: {path}")
 
   def assert_same_text_file_content(self, path1, path2):
     self.assert_is_file(path1)
     self.assert_is_file(path2)
+    if same_file_bytes(path1, path2):
+      return  # byte-identical, no need to decode
+    # decode only to get a readable diff in the failure message
     with open(path1, "r", encoding="utf8") as file1, open(
       path2, "r", encoding="utf8"
     ) as file2:
@@ -43,86 +128,102 @@ class FileSystemTestCase(TestCase):
   def assert_same_yaml_file_content(self, path1, path2):
     self.assert_is_file(path1)
     self.assert_is_file(path2)
-    with open(path1, "r", encoding="utf8") as file1, open(
-      path2, "r", encoding="utf8"
-    ) as file2:
-      yml1 = yaml.load(file1, Loader=yaml.Loader)
-      yml2 = yaml.load(file2, Loader=yaml.Loader)
-      if yml1 is not None and yml2 is not None:
-        self.assertDictEqual(yml1, yml2)
-      else:
-        self.assertEqual(yml1, yml2)
+    if same_file_bytes(path1, path2):
+      return  # byte-identical, no need to parse
+    yml1 = _parsed_yaml(path1)
+    yml2 = _parsed_yaml(path2)
+    if yml1 is not None and yml2 is not None:
+      self.assertDictEqual(yml1, yml2)
+    else:
+      self.assertEqual(yml1, yml2)
 
   def assert_same_dotenv_file_content(self, path1, path2):
     self.assert_is_file(path1)
     self.assert_is_file(path2)
-    dotenv1 = parse_dotenv(path1)
-    dotenv2 = parse_dotenv(path2)
+    if same_file_bytes(path1, path2):
+      return  # byte-identical, no need to parse
+    dotenv1 = _parsed_dotenv(path1)
+    dotenv2 = _parsed_dotenv(path2)
     self.assertDictEqual(dotenv1, dotenv2)
 
+  def assert_same_files_content(self, file_pairs):
+    """Compares (generated, reference) file pairs concurrently, all failures are reported at once"""
+    def compare(file_pair):
+      gen_filepath, ref_filepath = file_pair
+      try:
+        get_file_comparator(ref_filepath)(self, gen_filepath, ref_filepath)
+      except AssertionError as e:
+        return f"{gen_filepath}: {e}"
+      return None
+
+    if len(file_pairs) == 0:
+      return
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1, len(file_pairs))) as executor:
+      failures = [failure for failure in executor.map(compare, file_pairs) if failure is not None]
+    self.assertListEqual([], failures)
+
   def assert_same_directories(self, gen_path, ref_path, ignored: set=None):
     if ignored is None:
       ignored = set()
-    ref_rel_files = list_relative_files(ref_path)
-    for out_rel_file in ref_rel_files:
-      if out_rel_file in ignored:
-        continue
-      ref_filepath = os.path.join(ref_path, out_rel_file)
-      gen_filepath = os.path.join(gen_path, out_rel_file)
-      self.assert_is_file(gen_filepath)
-
-      if out_rel_file.endswith("yml") or out_rel_file.endswith("template"):
-        ### Check *.yml files
-        self.assert_same_yaml_file_content(gen_filepath, ref_filepath)
-      elif out_rel_file.endswith(".env"):
-        self.assert_same_dotenv_file_content(gen_filepath, ref_filepath)
-      else:
-        self.assert_same_text_file_content(gen_filepath, ref_filepath)
+    ref_rel_files = scan_relative_files(ref_path)
+    self.assert_same_files_content([
+      (os.path.join(gen_path, out_rel_file), os.path.join(ref_path, out_rel_file))
+      for out_rel_file in ref_rel_files
+      if out_rel_file not in ignored
+    ])
+
+
+# maps file extensions with the appropriate content comparison method
+FILE_COMPARATORS = {
+  ".yml": FileSystemTestCase.assert_same_yaml_file_content,
+  ".yaml": FileSystemTestCase.assert_same_yaml_file_content,
+  ".template": FileSystemTestCase.assert_same_yaml_file_content,
+  ".env": FileSystemTestCase.assert_same_dotenv_file_content,
+}
+
+
+def get_file_comparator(rel_path):
+  """Returns the comparison method to use for the given file (text comparison by default)"""
+  filename = os.path.basename(rel_path)
+  # a dotfile such as '.env' has no extension
+  extension = os.path.splitext(filename)[1] or filename
+  return FILE_COMPARATORS.get(extension, FileSystemTestCase.assert_same_text_file_content)
 
 
 class TestDeploymentGeneric(FileSystemTestCase):
-  def check_single_server_deployment(self, output_ref_path, output_gen_path):
-    """tests related to the tests/files/fake_single_server"""
-    out_rel_files = list_relative_files(output_ref_path)
+  def check_single_server_deployment(self, output_ref_path, output_gen_path, out_rel_files=None):
+    """tests related to the tests/files/fake_single_server
+    out_rel_files: listing of output_ref_path, if already available
+    """
+    if out_rel_files is None:
+      out_rel_files = list_relative_files(output_ref_path)
+    # (generated, reference) pairs without special handling, compared concurrently at the end
+    file_pairs = []
     for out_rel_file in out_rel_files:
-      reference_filepath = os.path.join(output_ref_path, out_rel_file)
-      generated_filepath = os.path.join(output_gen_path, out_rel_file)
+      reference_filepath = f"{output_ref_path}/{out_rel_file}"
+      generated_filepath = f"{output_gen_path}/{out_rel_file}"
+      out_basename = out_rel_file.rsplit(os.sep, 1)[-1]
       self.assert_is_file(generated_filepath)
 
-      if os.path.basename(out_rel_file) == "cytomine.yml":
+      if out_basename == "cytomine.yml":
         ### Check Cytomine.yml file
-        generated_content = parse_yaml(
-          os.path.dirname(generated_filepath), "cytomine.yml"
-        )
-        reference_content = parse_yaml(
-          os.path.dirname(reference_filepath), "cytomine.yml"
-        )
+        generated_content = parse_yaml(output_gen_path, out_rel_file)
+        reference_content = parse_yaml(output_ref_path, out_rel_file)
 
         # need to get the autogenerated field from the generated yaml
         # but first need to check if this field exists in the generated yaml
-        autogenerated_key_path = [
-          "services",
-          "default",
-          "ims",
-          "constant",
-          "IMS_VAR1",
-        ]
-        resolved = generated_content
-        for key in autogenerated_key_path:
-          self.assertIn(key, resolved)
-          resolved = resolved[key]
+        autogenerated_key_path = ("services", "default", "ims", "constant", "IMS_VAR1")
+        try:
+          resolved = functools.reduce(operator.getitem, autogenerated_key_path, generated_content)
+        except (KeyError, TypeError) as e:
+          self.fail(f"missing key {e} in generated cytomine.yml")
 
         reference_content["services"]["default"]["ims"]["constant"][
           "IMS_VAR1"
         ] = resolved
 
         self.assertDictEqual(generated_content, reference_content)
-      elif out_rel_file.endswith("yml"):
-        ### Check other *.yml files
-        self.assert_same_yaml_file_content(generated_filepath, reference_filepath)
-      elif out_rel_file.endswith(".env") and "ims" in os.path.basename(
-        out_rel_file
-      ):
+      elif out_basename.endswith(".env") and "ims" in out_basename:
         ### Check service ims.env files
         # need to replace the auto generated value !!
         reference_dotenv = parse_dotenv(reference_filepath)
@@ -130,11 +231,9 @@ class TestDeploymentGeneric(FileSystemTestCase):
         self.assertIn("IMS_VAR1", generated_dotenv)
         reference_dotenv["IMS_VAR1"] = generated_dotenv["IMS_VAR1"]
         self.assertDictEqual(generated_dotenv, reference_dotenv)
-      elif out_rel_file.endswith(".env"):
-        ### Check .env file
-        self.assert_same_dotenv_file_content(generated_filepath, reference_filepath)
-      else:  # check configuration files
-        self.assert_same_text_file_content(generated_filepath, reference_filepath)
+      else:  # other yml, .env and configuration files
+        file_pairs.append((generated_filepath, reference_filepath))
+    self.assert_same_files_content(file_pairs)
 
   def check_zip(self, out_ref_path, zip_dir):
     # check there is indeed a zip